@@ -1,7 +1,9 @@
 from typing import List, Optional
 
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, File, HTTPException, Request, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+import asyncio
 import base64
 import os
 
@@ -10,9 +12,20 @@ import model_loader
 import utils
 import compare_damage
 
-app = FastAPI(title="Vehicle Damage Detection Service")
+# ORJSONResponse serializes numpy scalars/arrays natively (OPT_SERIALIZE_NUMPY)
+# and is ~10x faster than the stdlib json encoder on detection payloads.
+app = FastAPI(title="Vehicle Damage Detection Service", default_response_class=ORJSONResponse)
 SAVE_DEBUG_IMAGES = os.getenv("SAVE_DEBUG_IMAGES", "false").lower() in {"1", "true", "yes"}
 
+# Decode threads for the /detect pipeline: cv2/turbojpeg release the GIL, so
+# image N+1 can be decoded while the GPU is still busy with image N.
+_decode_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+
+# All blocking inference runs here instead of on the event loop, so FastAPI can
+# keep accepting requests while the GPU works. A single worker serializes
+# access to the one GPU; CPU-only deployments can raise INFERENCE_WORKERS.
+_inference_pool = ThreadPoolExecutor(max_workers=int(os.getenv("INFERENCE_WORKERS", "1")))
+
 
 @app.on_event("startup")
 def on_startup():
@@ -22,23 +35,85 @@ def on_startup():
     model_loader.load_model()
 
 
-async def _run_inference(image_bytes: bytes, filename: Optional[str] = None):
-    try:
-        detections = analyzer.analyze_image_bytes(image_bytes)
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Inference failed: {exc}") from exc
-
+def _maybe_save_debug_image(image_bytes, detections, filename: Optional[str], decoded_img=None):
     # Persist a debug copy with the drawn bounding boxes for quick verification
     if SAVE_DEBUG_IMAGES:
         try:
-            utils.save_image_with_bboxes(image_bytes, detections, filename or "image.jpg")
+            if decoded_img is not None:
+                # Reuse the frame decoded for inference instead of decoding twice.
+                utils.save_image_with_bboxes_ndarray(decoded_img, detections, filename or "image.jpg")
+            else:
+                utils.save_image_with_bboxes(image_bytes, detections, filename or "image.jpg")
         except Exception as exc:
             # Saving previews should not break the API, so only log the error
             print(f"Failed to persist debug image: {exc}")
 
+
+async def _run_inference(image_bytes: bytes, filename: Optional[str] = None):
+    try:
+        detections, decoded_img = await asyncio.get_running_loop().run_in_executor(
+            _inference_pool, lambda: analyzer.analyze_image_bytes(image_bytes, return_image=True)
+        )
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Inference failed: {exc}") from exc
+
+    _maybe_save_debug_image(image_bytes, detections, filename, decoded_img)
     return detections
 
 
+async def _detect_pipelined(indexed, filenames):
+    """
+    Producer-consumer pipeline for multi-image requests: decode threads feed a
+    queue as each frame finishes, while the consumer drains whatever is ready
+    into micro-batches and runs inference. Decode of later images overlaps with
+    inference on earlier ones; response order is kept via the original slots.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def _decode_one(slot: int, content: bytes):
+        try:
+            img = await loop.run_in_executor(_decode_pool, analyzer.decode_image_bytes, content)
+        except Exception as exc:
+            await queue.put((slot, None, exc))
+        else:
+            await queue.put((slot, img, None))
+
+    producers = [asyncio.ensure_future(_decode_one(i, content)) for i, content in indexed]
+
+    results_by_slot = {}
+    pending = len(indexed)
+    try:
+        while pending:
+            slot, img, err = await queue.get()
+            pending -= 1
+            if err is not None:
+                raise err
+
+            slots, imgs = [slot], [img]
+            # Drain already-decoded frames into the same forward pass.
+            while len(imgs) < analyzer.MAX_BATCH and not queue.empty():
+                slot, img, err = queue.get_nowait()
+                pending -= 1
+                if err is not None:
+                    raise err
+                slots.append(slot)
+                imgs.append(img)
+
+            detections_per_image = await loop.run_in_executor(
+                _inference_pool, analyzer.analyze_decoded_batch, imgs
+            )
+            for slot, img, detections in zip(slots, imgs, detections_per_image):
+                results_by_slot[slot] = detections
+                # Debug copies reuse the frame decoded for inference.
+                _maybe_save_debug_image(None, detections, filenames[slot], img)
+    finally:
+        for task in producers:
+            task.cancel()
+
+    return results_by_slot
+
+
 @app.post("/detect")
 async def detect_damage(images: List[UploadFile] = File(...)):
     """
@@ -48,16 +123,39 @@ async def detect_damage(images: List[UploadFile] = File(...)):
     if not images:
         raise HTTPException(status_code=400, detail="No images were provided")
 
-    batched_results = []
-    for upload in images:
-        content = await upload.read()
-        if not content:
-            batched_results.append([])
-            continue
-        detections = await _run_inference(content, upload.filename)
-        batched_results.append(detections)
+    contents = await asyncio.gather(*(upload.read() for upload in images))
+
+    # Run every non-empty upload through the batched/pipelined path, then slot
+    # the results back so empty files still produce an empty detection list.
+    indexed = [(i, content) for i, content in enumerate(contents) if content]
+    batched_results: List[list] = [[] for _ in contents]
+    if indexed:
+        debug_saved = False
+        try:
+            if len(indexed) > 1 and not analyzer.gpu_decode_enabled():
+                results_by_slot = await _detect_pipelined(
+                    indexed, [upload.filename for upload in images]
+                )
+                debug_saved = True
+            else:
+                detections_per_image = await asyncio.get_running_loop().run_in_executor(
+                    _inference_pool,
+                    analyzer.analyze_images_bytes_batch,
+                    [content for _, content in indexed],
+                )
+                results_by_slot = {
+                    i: detections
+                    for (i, _), detections in zip(indexed, detections_per_image)
+                }
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=f"Inference failed: {exc}") from exc
+
+        for i, content in indexed:
+            batched_results[i] = results_by_slot[i]
+            if not debug_saved:
+                _maybe_save_debug_image(content, results_by_slot[i], images[i].filename)
 
-    return JSONResponse(content=batched_results)
+    return ORJSONResponse(content=batched_results)
 
 
 @app.post("/analyze")
@@ -94,7 +192,7 @@ async def analyze_single_image(request: Request, file: UploadFile = File(None)):
         raise HTTPException(status_code=400, detail="Empty image payload")
 
     detections = await _run_inference(image_bytes, filename)
-    return JSONResponse(content=detections)
+    return ORJSONResponse(content=detections)
 
 
 @app.post("/compare-pair")
@@ -116,10 +214,16 @@ async def compare_pickup_return(
         raise HTTPException(status_code=400, detail="Both pickup and return images are required")
 
     try:
-        result = compare_damage.analyze_pickup_return(
-            pickup_bytes, return_bytes, iou_threshold=iou_threshold, compute_similarity=True
+        # Run in the inference pool: this keeps the event loop free and, with
+        # the default single worker, serializes the YOLO model access with
+        # /detect (the predictor fast paths share mutable per-model state).
+        result = await asyncio.get_running_loop().run_in_executor(
+            _inference_pool,
+            lambda: compare_damage.analyze_pickup_return(
+                pickup_bytes, return_bytes, iou_threshold=iou_threshold, compute_similarity=True
+            ),
         )
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Comparison failed: {exc}") from exc
 
-    return JSONResponse(content=result)
+    return ORJSONResponse(content=result)
@@ -0,0 +1,83 @@
+"""
+Build an INT8-calibrated TensorRT engine for the damage-detection weights.
+
+TensorRT calibrates activation ranges by running a few hundred representative
+images through the network, so this script expects the YOLO-formatted CarDD
+dataset produced by cardd_trainer.py. Typical usage (from the ai-service
+directory):
+
+    python calibrate_int8.py --weights runs/detect/cardd2/weights/best.pt \
+        --data data/cardd_yolo/cardd.yaml
+
+The resulting <weights>_int8.engine is written next to the .pt file and is
+picked up by model_loader when YOLO_USE_TRT=1 and YOLO_PRECISION=int8. GPUs
+without INT8 tensor cores should stay on the default FP16 engine instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import shutil
+import sys
+from pathlib import Path
+from typing import Iterable
+
+from ultralytics import YOLO
+
+import model_loader
+
+
+def export_int8_engine(
+    weights: Path,
+    data_yaml: Path,
+    imgsz: int,
+    workspace: int,
+) -> Path:
+    """
+    Export the weights to an INT8 TensorRT engine calibrated on the dataset.
+    """
+    if not data_yaml.exists():
+        raise FileNotFoundError(
+            f"Calibration dataset config not found: {data_yaml}. "
+            "Run cardd_trainer.py (or pass --data) so calibration images exist."
+        )
+
+    logging.info("Exporting %s to an INT8 engine calibrated on %s", weights, data_yaml)
+    model = YOLO(str(weights))
+    exported = model.export(
+        format="engine",
+        int8=True,
+        data=str(data_yaml),
+        imgsz=imgsz,
+        dynamic=False,
+        workspace=workspace,
+    )
+
+    # Ultralytics writes <stem>.engine; rename so the INT8 build can coexist
+    # with the FP16 engine produced lazily by model_loader.
+    target = weights.with_name(weights.stem + "_int8.engine")
+    exported_path = Path(exported)
+    if exported_path.resolve() != target.resolve():
+        shutil.move(str(exported_path), str(target))
+    logging.info("INT8 engine ready at %s", target)
+    return target
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Calibrate an INT8 TensorRT engine")
+    parser.add_argument("--weights", default=model_loader.DEFAULT_MODEL_PATH, help="Path to the trained .pt weights")
+    parser.add_argument("--data", default="data/cardd_yolo/cardd.yaml", help="Ultralytics data yaml used for calibration images")
+    parser.add_argument("--imgsz", type=int, default=model_loader.IMGSZ, help="Input size the engine is built for")
+    parser.add_argument("--workspace", type=int, default=4, help="TensorRT builder workspace in GiB")
+    return parser.parse_args(list(argv))
+
+
+def main(argv: Iterable[str] | None = None) -> None:
+    args = _parse_args(argv or sys.argv[1:])
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    export_int8_engine(Path(args.weights), Path(args.data), args.imgsz, args.workspace)
+
+
+if __name__ == "__main__":
+    main()
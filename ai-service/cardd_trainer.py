@@ -26,6 +26,7 @@ import logging
 import os
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Any, Dict, Iterable
 
@@ -34,6 +35,11 @@ try:
 except Exception:  # pragma: no cover - torch is optional for CPU-only users
     torch = None
 
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional, ~3-5x faster manifest parsing
+    orjson = None
+
 from huggingface_hub import snapshot_download
 from ultralytics import YOLO
 
@@ -157,8 +163,10 @@ def _sample_random_value(sample: Dict) -> float:
         or sample.get("_id", {}).get("$oid")
         or json.dumps(sample, sort_keys=True)
     )
-    digest = hashlib.md5(identifier.encode("utf-8")).digest()
-    return int.from_bytes(digest[:8], "big") / float(0xFFFFFFFFFFFFFFFF)
+    # blake2b is considerably faster than md5 on short identifiers and ships
+    # with the stdlib, so conversion does not pick up a new dependency.
+    digest = hashlib.blake2b(identifier.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / float(0xFFFFFFFFFFFFFFFF)
 
 
 def _decide_split(rand_value: float, train_ratio: float, val_ratio: float) -> str:
@@ -222,13 +230,16 @@ def convert_to_yolo(
         (output_dir / "images" / split).mkdir(parents=True, exist_ok=True)
         (output_dir / "labels" / split).mkdir(parents=True, exist_ok=True)
 
-    with samples_path.open("r", encoding="utf-8") as handle:
-        payload = json.load(handle)
+    if orjson is not None:
+        payload = orjson.loads(samples_path.read_bytes())
+    else:
+        with samples_path.open("r", encoding="utf-8") as handle:
+            payload = json.load(handle)
 
-    processed = 0
-    split_counts = {"train": 0, "val": 0, "test": 0}
+    # First pass (cheap, CPU-only): decide splits and format label rows.
+    tasks = []
     for sample in payload.get("samples", []):
-        if max_images and processed >= max_images:
+        if max_images and len(tasks) >= max_images:
             break
 
         rel_image = sample.get("filepath")
@@ -248,18 +259,34 @@ def convert_to_yolo(
             # Images without annotations are not very useful for detection.
             continue
 
-        split_images = output_dir / "images" / split
-        split_labels = output_dir / "labels" / split
-        split_images.mkdir(parents=True, exist_ok=True)
-        split_labels.mkdir(parents=True, exist_ok=True)
-
         image_name = Path(rel_image).name
         label_name = Path(image_name).with_suffix(".txt").name
+        tasks.append(
+            (
+                split,
+                source_image,
+                output_dir / "images" / split / image_name,
+                output_dir / "labels" / split / label_name,
+                "\n".join(label_lines),
+            )
+        )
+
+    def _write_sample(task):
+        split, source_image, image_dst, label_dst, label_text = task
+        _materialize_image(source_image, image_dst, prefer_copy)
+        label_dst.write_text(label_text, encoding="utf-8")
+        return split
 
-        _materialize_image(source_image, split_images / image_name, prefer_copy)
-        (split_labels / label_name).write_text("\n".join(label_lines), encoding="utf-8")
-        processed += 1
-        split_counts[split] += 1
+    # Second pass: the copy/hardlink and label writes are disk-bound and
+    # independent, so fan them out over a thread pool.
+    processed = 0
+    split_counts = {"train": 0, "val": 0, "test": 0}
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_write_sample, task) for task in tasks]
+        for future in as_completed(futures):
+            split_counts[future.result()] += 1
+            processed += 1
 
     if processed == 0:
         raise RuntimeError("No images were converted - ensure the dataset was downloaded correctly")
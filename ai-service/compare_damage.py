@@ -7,22 +7,39 @@ Compare pickup/return images by:
 
 from __future__ import annotations
 
+import hashlib
 import io
+import os
+from collections import OrderedDict
 from functools import lru_cache
 from typing import Any, Dict, List, Tuple
 
+import numpy as np
 import torch
 from PIL import Image
 import open_clip
 
+try:
+    import imagehash
+except Exception:  # pragma: no cover - optional, enables the pHash shortcut
+    imagehash = None
+
 import analyzer
 
+# Cheap pre-checks that can answer "same image?" without a CLIP forward pass.
+SIMILARITY_SHORTCUT = os.getenv("SIMILARITY_SHORTCUT", "true").lower() in {"1", "true", "yes"}
+
 
 def _load_image_from_bytes(payload: bytes) -> Image.Image:
     img = Image.open(io.BytesIO(payload)).convert("RGB")
     return img
 
 
+# torch.compile trades a slow first request for faster steady-state forwards,
+# so keep it opt-in for deployments that can afford the warmup.
+CLIP_COMPILE = os.getenv("CLIP_COMPILE", "false").lower() in {"1", "true", "yes"}
+
+
 @lru_cache(maxsize=1)
 def _get_clip_model(model_name: str, pretrained: str, device: str) -> Tuple[torch.nn.Module, Any, str]:
     """
@@ -32,9 +49,39 @@ def _get_clip_model(model_name: str, pretrained: str, device: str) -> Tuple[torc
         model_name, pretrained=pretrained, device=device
     )
     model.eval()
+    if device.startswith("cuda"):
+        # FP16 halves memory traffic and keeps attention on tensor cores; recent
+        # open_clip already routes through scaled_dot_product_attention.
+        model = model.half()
+    if CLIP_COMPILE and hasattr(torch, "compile"):
+        try:
+            model = torch.compile(model, mode="reduce-overhead", fullgraph=False)
+        except Exception:
+            # Older torch builds / unsupported backends keep the eager model.
+            pass
     return model, preprocess, device
 
 
+# One pickup image is typically compared against several return shots, so keep
+# a small LRU of normalized pickup embeddings keyed by content digest.
+_PICKUP_CACHE_SIZE = 32
+_pickup_embedding_cache: "OrderedDict[bytes, torch.Tensor]" = OrderedDict()
+
+
+def _cached_pickup_embedding(pickup_bytes: bytes):
+    key = hashlib.blake2b(pickup_bytes, digest_size=16).digest()
+    cached = _pickup_embedding_cache.get(key)
+    if cached is not None:
+        _pickup_embedding_cache.move_to_end(key)
+    return key, cached
+
+
+def _store_pickup_embedding(key: bytes, embedding: torch.Tensor) -> None:
+    _pickup_embedding_cache[key] = embedding.detach().float().cpu()
+    if len(_pickup_embedding_cache) > _PICKUP_CACHE_SIZE:
+        _pickup_embedding_cache.popitem(last=False)
+
+
 def compute_similarity_bytes(
     pickup_bytes: bytes,
     return_bytes: bytes,
@@ -44,25 +91,80 @@ def compute_similarity_bytes(
     device: str | None = None,
 ) -> float:
     """
-    Compute cosine similarity between two images given as bytes.
+    Compute cosine similarity between two images given as bytes. Both images go
+    through encode_image as one batch (one forward pass instead of two), and
+    pickup embeddings are reused across requests via the digest-keyed cache.
     """
     device = device or ("cuda" if torch.cuda.is_available() else "cpu")
     model, preprocess, device = _get_clip_model(model_name, pretrained, device)
 
-    img_a = preprocess(_load_image_from_bytes(pickup_bytes)).unsqueeze(0).to(device)
-    img_b = preprocess(_load_image_from_bytes(return_bytes)).unsqueeze(0).to(device)
+    cache_key, emb_a = _cached_pickup_embedding(pickup_bytes)
+
+    tensors = []
+    if emb_a is None:
+        tensors.append(preprocess(_load_image_from_bytes(pickup_bytes)))
+    tensors.append(preprocess(_load_image_from_bytes(return_bytes)))
+    batch = torch.stack(tensors).to(device)
 
     device_type = "cuda" if device.startswith("cuda") else "cpu"
+    if device_type == "cuda":
+        batch = batch.half()
     with torch.no_grad(), torch.autocast(device_type=device_type, enabled=device_type == "cuda"):
-        emb_a = model.encode_image(img_a)
-        emb_b = model.encode_image(img_b)
+        emb = model.encode_image(batch)
+
+    emb = emb / emb.norm(dim=-1, keepdim=True)
+    if emb_a is None:
+        emb_a = emb[:1]
+        _store_pickup_embedding(cache_key, emb_a)
+    else:
+        emb_a = emb_a.to(emb.device, dtype=emb.dtype)
+    emb_b = emb[-1:]
 
-    emb_a = emb_a / emb_a.norm(dim=-1, keepdim=True)
-    emb_b = emb_b / emb_b.norm(dim=-1, keepdim=True)
     similarity = (emb_a * emb_b).sum(dim=-1).item()
     return float(similarity)
 
 
+_PHASH_CACHE_SIZE = 64
+_phash_cache: "OrderedDict[bytes, Any]" = OrderedDict()
+
+
+def _phash_for_bytes(payload: bytes):
+    key = hashlib.blake2b(payload, digest_size=16).digest()
+    cached = _phash_cache.get(key)
+    if cached is not None:
+        _phash_cache.move_to_end(key)
+        return cached
+    value = imagehash.phash(Image.open(io.BytesIO(payload)))
+    _phash_cache[key] = value
+    if len(_phash_cache) > _PHASH_CACHE_SIZE:
+        _phash_cache.popitem(last=False)
+    return value
+
+
+def _similarity_shortcut(pickup_bytes: bytes, return_bytes: bytes) -> float | None:
+    """
+    Decide similarity without CLIP when the answer is obvious: byte-identical
+    uploads and near-identical perceptual hashes score 1.0, clearly different
+    hashes score 0.0. Returns None when CLIP should decide (the ambiguous band,
+    imagehash missing, or the shortcut disabled).
+    """
+    if not SIMILARITY_SHORTCUT:
+        return None
+    if pickup_bytes == return_bytes:
+        return 1.0
+    if imagehash is None:
+        return None
+    try:
+        distance = _phash_for_bytes(pickup_bytes) - _phash_for_bytes(return_bytes)
+    except Exception:
+        return None
+    if distance <= 4:
+        return 1.0
+    if distance >= 32:
+        return 0.0
+    return None
+
+
 def _det_to_xyxy(det: Dict) -> Tuple[float, float, float, float]:
     x = float(det["x"])
     y = float(det["y"])
@@ -71,20 +173,28 @@ def _det_to_xyxy(det: Dict) -> Tuple[float, float, float, float]:
     return x, y, x + w, y + h
 
 
-def _iou(box_a: Tuple[float, float, float, float], box_b: Tuple[float, float, float, float]) -> float:
-    ax1, ay1, ax2, ay2 = box_a
-    bx1, by1, bx2, by2 = box_b
-    inter_x1 = max(ax1, bx1)
-    inter_y1 = max(ay1, by1)
-    inter_x2 = min(ax2, bx2)
-    inter_y2 = min(ay2, by2)
-    inter_w = max(0.0, inter_x2 - inter_x1)
-    inter_h = max(0.0, inter_y2 - inter_y1)
-    inter_area = inter_w * inter_h
-    area_a = max(0.0, ax2 - ax1) * max(0.0, ay2 - ay1)
-    area_b = max(0.0, bx2 - bx1) * max(0.0, by2 - by1)
-    denom = area_a + area_b - inter_area
-    return inter_area / denom if denom > 0 else 0.0
+def _dets_to_xyxy_array(dets: List[Dict]) -> np.ndarray:
+    return np.array([_det_to_xyxy(det) for det in dets], dtype=np.float32)
+
+
+def _iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Broadcasted IoU between (N, 4) and (M, 4) xyxy arrays, returned as (N, M).
+    """
+    inter_wh = np.maximum(
+        0.0,
+        np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+        - np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2]),
+    )
+    inter_area = inter_wh.prod(axis=-1)
+    area_a = np.maximum(0.0, boxes_a[:, 2] - boxes_a[:, 0]) * np.maximum(
+        0.0, boxes_a[:, 3] - boxes_a[:, 1]
+    )
+    area_b = np.maximum(0.0, boxes_b[:, 2] - boxes_b[:, 0]) * np.maximum(
+        0.0, boxes_b[:, 3] - boxes_b[:, 1]
+    )
+    denom = area_a[:, None] + area_b[None, :] - inter_area
+    return np.where(denom > 0, inter_area / np.maximum(denom, 1e-12), 0.0)
 
 
 def find_new_damages(
@@ -94,25 +204,31 @@ def find_new_damages(
 ) -> List[Dict]:
     """
     Mark damages present in the return image that were not seen in the pickup image.
-    Matching is based on class name and IoU overlap with pickup boxes.
+    Matching is based on class name and IoU overlap with pickup boxes; the IoU is
+    computed as one broadcasted matrix per class group instead of box-by-box.
     """
-    pickup_by_class = {}
+    pickup_by_class: Dict[str, List[Dict]] = {}
     for det in pickup_detections:
         pickup_by_class.setdefault(det["class"], []).append(det)
 
-    new_items: List[Dict] = []
-    for ret_det in return_detections:
-        candidates = pickup_by_class.get(ret_det["class"], [])
-        ret_box = _det_to_xyxy(ret_det)
+    return_indices_by_class: Dict[str, List[int]] = {}
+    for idx, det in enumerate(return_detections):
+        return_indices_by_class.setdefault(det["class"], []).append(idx)
+
+    matched = [False] * len(return_detections)
+    for class_name, indices in return_indices_by_class.items():
+        candidates = pickup_by_class.get(class_name)
+        if not candidates:
+            continue
+        iou = _iou_matrix(
+            _dets_to_xyxy_array([return_detections[i] for i in indices]),
+            _dets_to_xyxy_array(candidates),
+        )
+        hits = (iou >= iou_threshold).any(axis=1).tolist()
+        for idx, hit in zip(indices, hits):
+            matched[idx] = hit
 
-        matched = False
-        for cand in candidates:
-            if _iou(ret_box, _det_to_xyxy(cand)) >= iou_threshold:
-                matched = True
-                break
-        if not matched:
-            new_items.append(ret_det)
-    return new_items
+    return [det for det, hit in zip(return_detections, matched) if not hit]
 
 
 def analyze_pickup_return(
@@ -130,7 +246,9 @@ def analyze_pickup_return(
 
     similarity = None
     if compute_similarity:
-        similarity = compute_similarity_bytes(pickup_bytes, return_bytes)
+        similarity = _similarity_shortcut(pickup_bytes, return_bytes)
+        if similarity is None:
+            similarity = compute_similarity_bytes(pickup_bytes, return_bytes)
 
     new_damages = find_new_damages(pickup_dets, return_dets, iou_threshold=iou_threshold)
     return {
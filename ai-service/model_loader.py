@@ -1,7 +1,13 @@
 from ultralytics import YOLO
+import numpy as np
 import os
 import logging
 
+try:
+    import torch
+except Exception:  # pragma: no cover - torch is optional for CPU-only users
+    torch = None
+
 # Store a single YOLO model instance so we do not reload weights for each request
 _model = None
 
@@ -10,10 +16,134 @@ DEFAULT_MODEL_PATH = os.getenv(
     "YOLO_MODEL_PATH", "runs/detect/cardd2/weights/best.pt"
 )
 
+# Inference image size. predict() must be called with the same value the engine
+# was exported with, otherwise TensorRT falls back to the slow generic path.
+IMGSZ = int(os.getenv("YOLO_IMGSZ", "960"))
+
+# Opt-in TensorRT acceleration: export the .pt weights once to a fused FP16
+# engine and serve all subsequent predictions through it.
+USE_TRT = os.getenv("YOLO_USE_TRT", "false").lower() in {"1", "true", "yes"}
+
+# Engine precision to serve. "int8" expects a calibrated <stem>_int8.engine
+# built by calibrate_int8.py; anything else uses the FP16 export path.
+TRT_PRECISION = os.getenv("YOLO_PRECISION", "fp16").lower()
+
+# Opt-in CUDA graph capture for the batch-1 forward pass, which is dominated
+# by kernel-launch overhead rather than compute.
+USE_CUDA_GRAPHS = os.getenv("YOLO_CUDA_GRAPHS", "false").lower() in {"1", "true", "yes"}
+
+
+def _export_trt_engine(model, weights_path: str) -> str:
+    """
+    Export the loaded PyTorch weights to a TensorRT engine, cached next to the .pt.
+    """
+    engine_path = os.path.splitext(weights_path)[0] + ".engine"
+    if not os.path.exists(engine_path):
+        logging.info("Exporting %s to TensorRT engine %s", weights_path, engine_path)
+        model.export(format="engine", half=True, imgsz=IMGSZ, dynamic=False, workspace=4)
+    return engine_path
+
+
+def _select_engine(model, weights_path: str) -> str:
+    """
+    Pick the engine to serve: the pre-calibrated INT8 build when requested and
+    present, otherwise the FP16 engine (exported on demand).
+    """
+    if TRT_PRECISION == "int8":
+        int8_path = os.path.splitext(weights_path)[0] + "_int8.engine"
+        if os.path.exists(int8_path):
+            return int8_path
+        logging.warning(
+            "YOLO_PRECISION=int8 but %s is missing - run calibrate_int8.py first. "
+            "Falling back to the FP16 engine.",
+            int8_path,
+        )
+    return _export_trt_engine(model, weights_path)
+
 
 def _load_weights(path: str):
     logging.info("Loading YOLO weights from %s", path)
-    return YOLO(path)
+    model = YOLO(path)
+    if path.endswith(".pt"):
+        # Fold BatchNorm into the preceding convolutions now instead of letting
+        # Ultralytics do it lazily on the first request; ~10-20% fewer kernels
+        # per forward and the fused graph is also what a TRT export sees.
+        try:
+            model.fuse()
+        except Exception as exc:
+            logging.warning("Conv+BN fuse failed (%s). Continuing unfused.", exc)
+    if USE_TRT and path.endswith(".pt"):
+        try:
+            engine_path = _select_engine(model, path)
+            model = YOLO(engine_path)
+            logging.info("Serving inference through TensorRT engine %s", engine_path)
+        except Exception as exc:
+            logging.warning(
+                "TensorRT export failed (%s). Staying on the PyTorch weights.", exc
+            )
+    return model
+
+
+def _attach_name_table(model):
+    """
+    Precompute class_id -> display name so hot detection loops index a list
+    instead of doing a dict lookup plus f-string fallback per box.
+    """
+    try:
+        names = model.names
+        model._name_table = [names.get(i, f"class_{i}") for i in range(max(names) + 1)]
+    except Exception:
+        model._name_table = []
+
+
+def _maybe_capture_cuda_graph(model):
+    """
+    Record the fixed-shape (1, 3, IMGSZ, IMGSZ) forward pass into a CUDA graph.
+    Replaying the graph re-issues the whole kernel sequence with a single
+    launch, which is where most of the batch-1 latency goes. The analyzer uses
+    the captured triple for single-image requests and falls back to eager
+    predict for any other shape.
+    """
+    if not USE_CUDA_GRAPHS:
+        return
+    if torch is None or not torch.cuda.is_available():
+        logging.warning("YOLO_CUDA_GRAPHS is set but CUDA is unavailable; using eager predict.")
+        return
+    try:
+        # Freshly loaded .pt weights stay on the CPU until the first predict
+        # builds the predictor and moves the module to the selected device, so
+        # warm up before inspecting (and capturing against) the parameters.
+        model.predict(
+            source=np.zeros((64, 64, 3), np.uint8), imgsz=IMGSZ, save=False, verbose=False
+        )
+
+        device = next(model.model.parameters()).device
+        dtype = next(model.model.parameters()).dtype
+        if device.type != "cuda":
+            logging.warning(
+                "Model is on %s after warmup; skipping CUDA graph capture.", device
+            )
+            return
+
+        static_input = torch.zeros((1, 3, IMGSZ, IMGSZ), dtype=dtype, device=device)
+
+        # Warm up on a side stream so lazy cuDNN/cuBLAS init is not captured.
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream), torch.inference_mode():
+            for _ in range(3):
+                model.model(static_input)
+        torch.cuda.current_stream().wait_stream(stream)
+        torch.cuda.synchronize()
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.inference_mode(), torch.cuda.graph(graph):
+            static_output = model.model(static_input)
+
+        model._cuda_graph = (graph, static_input, static_output)
+        logging.info("Captured CUDA graph for (1, 3, %s, %s) inference", IMGSZ, IMGSZ)
+    except Exception as exc:
+        logging.warning("CUDA graph capture failed (%s). Using eager predict.", exc)
 
 
 def load_model(model_path: str = DEFAULT_MODEL_PATH):
@@ -33,6 +163,8 @@ def load_model(model_path: str = DEFAULT_MODEL_PATH):
                 fallback,
             )
             _model = _load_weights(fallback)
+        _attach_name_table(_model)
+        _maybe_capture_cuda_graph(_model)
     return _model
 
 